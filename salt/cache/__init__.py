@@ -10,9 +10,17 @@ from __future__ import absolute_import, print_function, unicode_literals
 import logging
 import time
 
+# Import 3rd-party libs
+try:
+    import concurrent.futures
+    HAS_FUTURES = True
+except ImportError:
+    HAS_FUTURES = False
+
 # Import Salt libs
 import salt.config
 from salt.ext import six
+from salt.ext.six.moves import range, zip  # pylint: disable=redefined-builtin
 from salt.payload import Serial
 from salt.utils.odict import OrderedDict
 import salt.loader
@@ -20,6 +28,9 @@ import salt.syspaths
 
 log = logging.getLogger(__name__)
 
+# Number of banks Cache.fetch_many() reads before handing their data out
+FETCH_MANY_CHUNK_SIZE = 100
+
 
 def factory(opts, **kwargs):
     '''
@@ -179,6 +190,72 @@ class Cache(object):
         fun = '{0}.fetch'.format(self.driver)
         return self.modules[fun](bank, key, **self._kwargs)
 
+    @property
+    def thread_safe(self):
+        '''
+        Whether the functions of the cache driver can be called from several
+        threads at once. Drivers opt in by providing a ``thread_safe``
+        function returning True.
+        '''
+        fun = '{0}.thread_safe'.format(self.driver)
+        return fun in self.modules and bool(self.modules[fun]())
+
+    def fetch_many(self, banks, key):
+        '''
+        Fetch the same key from a number of banks
+
+        The banks are fetched in chunks, so that only the data of one chunk
+        is held in memory at a time. Drivers providing a ``fetch_many``
+        function get each chunk in one call. For thread safe drivers the
+        single fetches are spread over up to ``cache_workers`` threads, other
+        drivers fetch the banks one after the other.
+
+        :param banks:
+            An iterable of the names of the locations inside the cache which
+            hold the key and its associated data.
+
+        :param key:
+            The name of the key (or file inside a directory) which will hold
+            the data. File extensions should not be provided, as they will be
+            added by the driver itself.
+
+        :return:
+            Return an iterator of ``(bank, data)`` tuples in the order of
+            ``banks``, ``data`` being the python object fetched from the
+            cache, or an empty dict if the key was not found there.
+
+        :raises SaltCacheError:
+            Raises an exception if cache driver detected an error accessing data
+            in the cache backend (auth, permissions, etc).
+        '''
+        banks = list(banks)
+        fun = '{0}.fetch_many'.format(self.driver)
+        if fun in self.modules:
+            fetch_many = self.modules[fun]
+            for idx in range(0, len(banks), FETCH_MANY_CHUNK_SIZE):
+                chunk = banks[idx:idx + FETCH_MANY_CHUNK_SIZE]
+                data = fetch_many(chunk, key, **self._kwargs)
+                for bank in chunk:
+                    yield bank, data[bank]
+            return
+
+        # Resolve the driver function before spawning any thread so the
+        # loader is only ever accessed from the calling thread
+        fetch = self.modules['{0}.fetch'.format(self.driver)]
+        workers = min(self.opts.get('cache_workers', 16), len(banks))
+        if not HAS_FUTURES or workers < 2 or not self.thread_safe:
+            for bank in banks:
+                yield bank, fetch(bank, key, **self._kwargs)
+            return
+
+        chunk_size = max(FETCH_MANY_CHUNK_SIZE, workers)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for idx in range(0, len(banks), chunk_size):
+                chunk = banks[idx:idx + chunk_size]
+                data = executor.map(lambda bank: fetch(bank, key, **self._kwargs), chunk)
+                for item in zip(chunk, data):
+                    yield item
+
     def updated(self, bank, key):
         '''
         Get the last updated epoch for the specified key
@@ -342,6 +419,17 @@ class MemCache(Cache):
         self.storage[(bank, key)] = [now, data]
         return data
 
+    @property
+    def thread_safe(self):
+        # The in-memory storage is shared and not thread safe
+        return False
+
+    def fetch_many(self, banks, key):
+        # Go through fetch() for each bank to keep the in-memory storage
+        # consistent
+        for bank in banks:
+            yield bank, self.fetch(bank, key)
+
     def store(self, bank, key, data):
         self.storage.pop((bank, key), None)
         super(MemCache, self).store(bank, key, data)
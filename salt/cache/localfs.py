@@ -41,6 +41,14 @@ def get_storage_id(kwargs):
     return ('localfs', __cachedir(kwargs))
 
 
+def thread_safe():
+    '''
+    Every fetch reads its own file, Cache.fetch_many() may run them in
+    several threads at once.
+    '''
+    return True
+
+
 def store(bank, key, data, cachedir):
     '''
     Store information in a file.
@@ -211,6 +211,24 @@ def fetch(bank, key):
     return __context__['serial'].loads(r[0])
 
 
+def fetch_many(banks, key):
+    '''
+    Fetch the same key from a number of banks with a single query.
+    '''
+    _init_client()
+    ret = dict((bank, {}) for bank in banks)
+    if not ret:
+        return ret
+    query = "SELECT bank, data FROM {0} WHERE etcd_key='{1}' AND bank IN ({2})".format(
+        _table_name, key, ', '.join("'{0}'".format(bank) for bank in ret))
+    cur, _ = run_query(client, query)
+    for bank, data in cur.fetchall():
+        if bank in ret:
+            ret[bank] = __context__['serial'].loads(data)
+    cur.close()
+    return ret
+
+
 def flush(bank, key=None):
     '''
     Remove the key from the cache bank with all the key content.
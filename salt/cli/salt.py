@@ -8,6 +8,7 @@ import os
 
 # Import Salt libs
 import salt.defaults.exitcodes
+import salt.utils.data
 import salt.utils.job
 import salt.utils.parsers
 import salt.utils.stringutils
@@ -227,7 +228,8 @@ class SaltCMD(salt.utils.parsers.SaltCMDOptionParser):
         '''
         Return a list of minions from a given target
         '''
-        return self.local_client.gather_minions(self.config['tgt'], self.selected_target_option or 'glob')
+        return salt.utils.data.sorted_ignorecase(
+            self.local_client.gather_minions(self.config['tgt'], self.selected_target_option or 'glob'))
 
     def _run_batch(self):
         import salt.cli.batch
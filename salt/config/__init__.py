@@ -859,6 +859,11 @@ VALID_OPTS = immutabletypes.freeze({
     # reply from executions.
     'minion_data_cache': bool,
 
+    # Seconds the reverse indexes used to match literal grain and pillar
+    # targets and IP/CIDR targets against the minion data cache are kept.
+    # 0 disables them.
+    'minion_data_cache_index_ttl': int,
+
     # The number of seconds between AES key rotations on the master
     'publish_session': int,
 
@@ -1115,6 +1120,9 @@ VALID_OPTS = immutabletypes.freeze({
     'memcache_full_cleanup': bool,
     # Enable collecting the memcache stats and log it on `debug` log level.
     'memcache_debug': bool,
+    # Number of threads used to fetch data from the minion data cache and to
+    # match the minion data cache based terms of compound targets
+    'cache_workers': int,
 
     # Thin and minimal Salt extra modules
     'thin_extra_mods': six.string_types,
@@ -1706,6 +1714,7 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'master_job_cache': 'local_cache',
     'job_cache_store_endtime': False,
     'minion_data_cache': True,
+    'minion_data_cache_index_ttl': 0,
     'enforce_mine_cache': False,
     'ipc_mode': _DFLT_IPC_MODE,
     'ipc_write_buffer': _DFLT_IPC_WBUFFER,
@@ -1831,6 +1840,7 @@ DEFAULT_MASTER_OPTS = immutabletypes.freeze({
     'memcache_max_items': 1024,
     'memcache_full_cleanup': False,
     'memcache_debug': False,
+    'cache_workers': 16,
     'thin_extra_mods': '',
     'min_extra_mods': '',
     'ssl': None,
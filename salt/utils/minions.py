@@ -7,8 +7,12 @@ expected to return
 # Import python libs
 from __future__ import absolute_import, unicode_literals
 import os
+import bisect
+import collections
 import fnmatch
+import functools
 import re
+import time
 import logging
 
 # Import salt libs
@@ -24,9 +28,15 @@ from salt.exceptions import CommandExecutionError, SaltCacheError
 import salt.auth.ldap
 import salt.cache
 from salt.ext import six
+from salt.ext.six.moves import zip  # pylint: disable=redefined-builtin
 
 # Import 3rd-party libs
 from salt._compat import ipaddress
+try:
+    import concurrent.futures
+    HAS_FUTURES = True
+except ImportError:
+    HAS_FUTURES = False
 HAS_RANGE = False
 try:
     import seco.range  # pylint: disable=import-error
@@ -46,11 +56,240 @@ TARGET_REX = re.compile(
         (?P<pattern>.+)$'''                # The pattern passed to the target engine
     )
 
+# The target engines of TARGET_REX, and those of them accepting a delimiter
+TARGET_ENGINES = frozenset('GPIJLNSER')
+TARGET_DELIM_ENGINES = frozenset('GPIJ')
+
+# Largest number of minion data cache indexes kept by a CkMinions instance,
+# see CkMinions._cached_index()
+_CACHE_INDEX_MAX = 32
+
+# Coarsest timestamp resolution of the filesystems the PKI dir may be on, in
+# seconds (FAT stores modification times with a 2 seconds granularity)
+_MTIME_RESOLUTION = 2
+
+
+def _bounded_cache(maxsize):
+    '''
+    Memoize a function of hashable positional arguments. Once ``maxsize``
+    results are held the whole cache is dropped, the same way the Python 2
+    ``fnmatch`` module bounds its compiled pattern cache (``functools.lru_cache``
+    is not available on Python 2).
+    '''
+    def decorator(func):
+        cache = {}
+
+        @functools.wraps(func)
+        def wrapped(*args):
+            try:
+                return cache[args]
+            except KeyError:
+                pass
+            if len(cache) >= maxsize:
+                cache.clear()
+            ret = cache[args] = func(*args)
+            return ret
+        wrapped.cache_clear = cache.clear
+        return wrapped
+    return decorator
+
+
+@_bounded_cache(1024)
+def _compile_glob(expr):
+    '''
+    Return a function telling whether a name matches the glob ``expr``.
+    Plain names and patterns whose only wildcards are a leading and/or a
+    trailing ``*`` are matched with string methods, other patterns with a
+    compiled regex. Runs of ``*`` are collapsed first, as they otherwise
+    translate into a regex with exponential backtracking.
+    '''
+    expr = re.sub(r'\*{2,}', '*', expr)
+    literal = expr.strip('*')
+    if not any(char in literal for char in '*?['):
+        if expr.startswith('*') and expr.endswith('*'):
+            return lambda name: literal in name
+        elif expr.startswith('*'):
+            return lambda name: name.endswith(literal)
+        elif expr.endswith('*'):
+            return lambda name: name.startswith(literal)
+        return lambda name: name == literal
+    return re.compile(fnmatch.translate(expr)).match
+
+
+@_bounded_cache(1024)
+def _compile_pcre(expr):
+    '''
+    Return the compiled regex for ``expr``
+    '''
+    return re.compile(expr)
+
+
+def _compile_subdict_value(pattern, regex_match, exact_match):
+    '''
+    Return a function telling whether a single value matches ``pattern`` the
+    way salt.utils.data.subdict_match() compares them
+    '''
+    pattern = _match_value(pattern)
+    if regex_match:
+        try:
+            regex = _compile_pcre(pattern)
+        except Exception:
+            log.error('Invalid regex \'%s\' in match', pattern)
+            return lambda value: False
+        return lambda value: regex.match(_match_value(value)) is not None
+    if exact_match:
+        return lambda value: _match_value(value) == pattern
+    match = _compile_glob(pattern)
+    return lambda value: bool(match(_match_value(value)))
+
+
+@_bounded_cache(1024)
+def _compile_subdict_dict(pattern, regex_match, exact_match):
+    '''
+    Return a function telling whether a dict matches ``pattern`` the way
+    salt.utils.data.subdict_match() compares them
+    '''
+    wildcard = pattern.startswith('*:')
+    if wildcard:
+        pattern = pattern[2:]
+    match_value = _compile_subdict_value(pattern, regex_match, exact_match)
+
+    def match_dict(data):
+        if pattern == '*' or pattern in data:
+            return True
+        if _compile_subdict_predicate(pattern, DEFAULT_TARGET_DELIM,
+                                      regex_match, exact_match)(data):
+            return True
+        if wildcard:
+            for value in six.itervalues(data):
+                if isinstance(value, dict):
+                    if _compile_subdict_dict(pattern, regex_match, exact_match)(value):
+                        return True
+                elif isinstance(value, list):
+                    if any(match_value(item) for item in value):
+                        return True
+                elif match_value(value):
+                    return True
+        return False
+    return match_dict
+
+
+@_bounded_cache(1024)
+def _compile_subdict_predicate(expr, delimiter, regex_match, exact_match):
+    '''
+    Return a function of the grains or pillar data of a minion returning the
+    same as ``salt.utils.data.subdict_match(data, expr, delimiter,
+    regex_match, exact_match)``. The expression is split and the patterns
+    compiled only once.
+    '''
+    splits = expr.split(delimiter)
+    # If we have 4 splits, then we have three delimiters. Thus, the keys
+    # are tried using the first 3, 2 and 1 split, in that order.
+    candidates = []
+    for idx in range(len(splits) - 1, 0, -1):
+        key = delimiter.join(splits[:idx])
+        # Matching on everything under the top level ('*') uses the entire
+        # expression against the entire data
+        matchstr = expr if key == '*' else delimiter.join(splits[idx:])
+        candidates.append((
+            None if key == '*' else key,
+            _compile_subdict_value(matchstr, regex_match, exact_match),
+            _compile_subdict_dict(matchstr, regex_match, exact_match),
+        ))
+
+    def predicate(data):
+        for key, match_value, match_dict in candidates:
+            if key is None:
+                match = data
+            else:
+                match = salt.utils.data.traverse_dict_and_list(
+                    data, key, {}, delimiter=delimiter)
+            if match == {}:
+                continue
+            if isinstance(match, dict):
+                if match_dict(match):
+                    return True
+                continue
+            if isinstance(match, (list, tuple)):
+                # We are matching a single component to a single list member
+                for member in match:
+                    if isinstance(member, dict) and match_dict(member):
+                        return True
+                    if match_value(member):
+                        return True
+                continue
+            if match_value(match):
+                return True
+        return False
+    return predicate
+
+
+def _list_key_files(path):
+    '''
+    Return the names of the non-hidden regular files found in ``path``
+    '''
+    if hasattr(os, 'scandir'):
+        # The file type is read from the directory entry, sparing a stat()
+        # call per key for everything but symlinks
+        return [entry.name for entry in os.scandir(path)
+                if not entry.name.startswith('.') and entry.is_file()]
+    return [fn_ for fn_ in os.listdir(path)
+            if not fn_.startswith('.') and os.path.isfile(os.path.join(path, fn_))]
+
+
+def _match_value(value):
+    '''
+    Return ``value`` the way salt.utils.data.subdict_match() compares it to
+    a pattern, i.e. as a lowercase unicode string
+    '''
+    try:
+        return six.text_type(value).lower()
+    except UnicodeDecodeError:
+        return salt.utils.stringutils.to_unicode(value).lower()
+
+
+def _literal_subdict_expr(expr, delimiter, regex_match):
+    '''
+    Split a ``key<delimiter>value`` target into ``(key, value)`` when it can
+    be answered by comparing the value at ``key`` for equality, i.e. it nests
+    only one level deep and contains no wildcards. Return None otherwise.
+    '''
+    if regex_match:
+        return None
+    splits = expr.split(delimiter)
+    if len(splits) != 2 or splits[0] == '*':
+        return None
+    if any(char in expr for char in '*?['):
+        return None
+    if DEFAULT_TARGET_DELIM in splits[1]:
+        # Matching a dict at ``key`` goes on with the value split on the
+        # default delimiter, whatever the delimiter of the target
+        return None
+    return splits[0], splits[1]
+
 
 def parse_target(target_expression):
     '''Parse `target_expressing` splitting it into `engine`, `delimiter`,
      `pattern` - returns a dict'''
 
+    # Decide the common cases by looking at the first characters, the result
+    # is the same as matching TARGET_REX. Only leave the empty and multi-line
+    # expressions to the regex.
+    if target_expression and '\n' not in target_expression:
+        if len(target_expression) > 3 and target_expression[2] == '@' \
+                and target_expression[0] in TARGET_DELIM_ENGINES:
+            return {'engine': target_expression[0],
+                    'delimiter': target_expression[1],
+                    'pattern': target_expression[3:]}
+        if len(target_expression) > 2 and target_expression[1] == '@' \
+                and target_expression[0] in TARGET_ENGINES:
+            return {'engine': target_expression[0],
+                    'delimiter': None,
+                    'pattern': target_expression[2:]}
+        return {'engine': None,
+                'delimiter': None,
+                'pattern': target_expression}
+
     match = TARGET_REX.match(target_expression)
     if not match:
         log.warning('Unable to parse target "%s"', target_expression)
@@ -88,6 +327,10 @@ def get_minion_data(minion, opts):
     return minion if minion else None, grains, pillar
 
 
+# Characters telling a plain nodegroup definition is a regular expression
+_REGEX_CHARS = frozenset('([{\\?}])')
+
+
 def nodegroup_comp(nodegroup, nodegroups, skip=None, first_call=True):
     '''
     Recursively expand ``nodegroup`` from ``nodegroups``; ignore nodegroups in ``skip``
@@ -148,12 +391,11 @@ def nodegroup_comp(nodegroup, nodegroups, skip=None, first_call=True):
         if (set(ret) - opers_set) == set(ret):
             # No compound operators found in nodegroup definition. Check for
             # group type specifiers
-            group_type_re = re.compile('^[A-Z]@')
-            regex_chars = ['(', '[', '{', '\\', '?', '}', ']', ')']
-            if not [x for x in ret if '*' in x or group_type_re.match(x)]:
+            if not any('*' in x or (len(x) >= 2 and x[1] == '@' and 'A' <= x[0] <= 'Z')
+                       for x in ret):
                 # No group type specifiers and no wildcards.
                 # Treat this as an expression.
-                if [x for x in ret if x in [x for y in regex_chars if y in x]]:
+                if any(char in _REGEX_CHARS for x in ret for char in x):
                     joined = 'E@' + ','.join(ret)
                     log.debug(
                         'Nodegroup \'%s\' (%s) detected as an expression. '
@@ -192,17 +434,58 @@ class CkMinions(object):
         self.opts = opts
         self.serial = salt.payload.Serial(opts)
         self.cache = salt.cache.factory(opts)
+        self._cache_enabled = bool(opts.get('minion_data_cache', False))
+        # (PKI dir mtime, minion ids) of the last directory listing
+        self._pki_cache = None
+        # ((mtime, size, inode), minion ids) of the last key cache file read
+        self._key_cache = None
+        # Reverse indexes of the cached minion data,
+        # see _cache_index_match()
+        self._cache_index = {}
+        # Parsed compound targets and expanded nodegroups, valid for the
+        # nodegroups configuration they were expanded with
+        self._compound_cache = {}
+        self._nodegroup_cache = {}
+        self._cached_nodegroups = None
+        # Roster used to match the salt-ssh minions, see check_minions()
+        self._ssh_roster = None
         # TODO: this is actually an *auth* check
         if self.opts.get('transport', 'zeromq') in ('zeromq', 'tcp'):
             self.acc = 'minions'
         else:
             self.acc = 'accepted'
 
+    def _check_nodegroups(self):
+        '''
+        Drop the parsed compound targets and expanded nodegroups if the
+        nodegroups configuration was replaced since they were cached
+        '''
+        nodegroups = self.opts.get('nodegroups')
+        if nodegroups is not self._cached_nodegroups:
+            self._compound_cache.clear()
+            self._nodegroup_cache.clear()
+            self._cached_nodegroups = nodegroups
+
+    def _nodegroup_comp(self, nodegroup):
+        '''
+        Return nodegroup_comp() of ``nodegroup`` against the configured
+        nodegroups. Successful expansions are cached.
+        '''
+        self._check_nodegroups()
+        try:
+            return list(self._nodegroup_cache[nodegroup])
+        except KeyError:
+            pass
+        ret = nodegroup_comp(nodegroup, self.opts.get('nodegroups') or {})
+        if ret:
+            self._nodegroup_cache[nodegroup] = tuple(ret)
+        return ret
+
     def _check_nodegroup_minions(self, expr, greedy):  # pylint: disable=unused-argument
         '''
         Return minions found by looking at nodegroups
         '''
-        return self._check_compound_minions(nodegroup_comp(expr, self.opts['nodegroups']),
+        return self._check_compound_minions(self._nodegroup_comp(expr),
             DEFAULT_TARGET_DELIM,
             greedy)
 
@@ -210,7 +493,8 @@ class CkMinions(object):
         '''
         Return the minions found by looking via globs
         '''
-        return {'minions': fnmatch.filter(self._pki_minions(), expr),
+        match = _compile_glob(expr)
+        return {'minions': [m for m in self._pki_minions() if match(m)],
                 'missing': []}
 
     def _check_list_minions(self, expr, greedy, ignore_missing=False):  # pylint: disable=unused-argument
@@ -219,7 +503,7 @@ class CkMinions(object):
         '''
         if isinstance(expr, six.string_types):
             expr = [m for m in expr.split(',') if m]
-        minions = self._pki_minions()
+        minions = set(self._pki_minions())
         return {'minions': [x for x in expr if x in minions],
                 'missing': [] if ignore_missing else [x for x in expr if x not in minions]}
 
@@ -227,34 +511,58 @@ class CkMinions(object):
         '''
         Return the minions found by looking via regular expressions
         '''
-        reg = re.compile(expr)
+        reg = _compile_pcre(expr)
         return {'minions': [m for m in self._pki_minions() if reg.match(m)],
                 'missing': []}
 
     def _pki_minions(self):
         '''
-        Retreive complete minion list from PKI dir.
+        Retreive complete minion list from PKI dir, in no particular order.
         Respects cache if configured
         '''
         minions = []
-        pki_cache_fn = os.path.join(self.opts['pki_dir'], self.acc, '.key_cache')
+        pki_dir = os.path.join(self.opts['pki_dir'], self.acc)
+        pki_cache_fn = os.path.join(pki_dir, '.key_cache')
         try:
-            os.makedirs(os.path.dirname(pki_cache_fn))
+            os.makedirs(pki_dir)
         except OSError:
             pass
         try:
             if self.opts['key_cache'] and os.path.exists(pki_cache_fn):
                 log.debug('Returning cached minion list')
+                # The master replaces the key cache file when writing it,
+                # reuse the list loaded from it until that happens
+                stat = os.stat(pki_cache_fn)
+                key_cache_id = (getattr(stat, 'st_mtime_ns', stat.st_mtime),
+                                stat.st_size,
+                                stat.st_ino)
+                if self._key_cache is not None and self._key_cache[0] == key_cache_id:
+                    return list(self._key_cache[1])
                 if six.PY2:
                     with salt.utils.files.fopen(pki_cache_fn) as fn_:
-                        return self.serial.load(fn_)
+                        minions = self.serial.load(fn_)
                 else:
                     with salt.utils.files.fopen(pki_cache_fn, mode='rb') as fn_:
-                        return self.serial.load(fn_)
+                        minions = self.serial.load(fn_)
+                if isinstance(minions, list):
+                    self._key_cache = (key_cache_id, tuple(minions))
+                return minions
             else:
-                for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-                    if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                        minions.append(fn_)
+                # Accepting or deleting a key changes the mtime of the
+                # directory, reuse the last listing until that happens. A
+                # listing started within the timestamp resolution of that
+                # mtime is not kept, a key accepted right after it could
+                # leave the mtime unchanged.
+                now = time.time()
+                stat = os.stat(pki_dir)
+                mtime = getattr(stat, 'st_mtime_ns', stat.st_mtime)
+                if self._pki_cache is not None and self._pki_cache[0] == mtime:
+                    return list(self._pki_cache[1])
+                minions = _list_key_files(pki_dir)
+                if now - stat.st_mtime > _MTIME_RESOLUTION:
+                    self._pki_cache = (mtime, tuple(minions))
+                else:
+                    self._pki_cache = None
             return minions
         except OSError as exc:
             log.error(
@@ -275,23 +583,18 @@ class CkMinions(object):
         If 'greedy' return accepted minions that matched by the condition or absend in the cache.
         If not 'greedy' return the only minions have cache data and matched by the condition.
         '''
-        cache_enabled = self.opts.get('minion_data_cache', False)
-
         def list_cached_minions():
             return self.cache.list('minions')
 
         if greedy:
-            minions = []
-            for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-                if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                    minions.append(fn_)
-        elif cache_enabled:
+            minions = _list_key_files(os.path.join(self.opts['pki_dir'], self.acc))
+        elif self._cache_enabled:
             minions = list_cached_minions()
         else:
             return {'minions': [],
                     'missing': []}
 
-        if cache_enabled:
+        if self._cache_enabled:
             if greedy:
                 cminions = list_cached_minions()
             else:
@@ -300,25 +603,174 @@ class CkMinions(object):
                 return {'minions': minions,
                         'missing': []}
             minions = set(minions)
-            for id_ in cminions:
-                if greedy and id_ not in minions:
-                    continue
-                mdata = self.cache.fetch('minions/{0}'.format(id_), 'data')
+            literal = _literal_subdict_expr(expr, delimiter, regex_match)
+            if literal is not None and self.opts.get('minion_data_cache_index_ttl', 0) > 0:
+                cached, matched = self._cache_index_match(
+                    search_type, cminions, literal[0], literal[1], delimiter)
+                if greedy:
+                    # Minions without cached data are kept
+                    minions -= cached - matched
+                else:
+                    minions &= matched
+                return {'minions': list(minions),
+                        'missing': []}
+            match = _compile_subdict_predicate(expr, delimiter, regex_match, exact_match)
+            if greedy:
+                cminions = [id_ for id_ in cminions if id_ in minions]
+            for id_, mdata in self._minion_data(cminions):
                 if mdata is None:
                     if not greedy:
                         minions.remove(id_)
                     continue
-                search_results = mdata.get(search_type)
-                if not salt.utils.data.subdict_match(search_results,
-                                                     expr,
-                                                     delimiter=delimiter,
-                                                     regex_match=regex_match,
-                                                     exact_match=exact_match):
+                if not match(mdata.get(search_type)):
                     minions.remove(id_)
             minions = list(minions)
         return {'minions': minions,
                 'missing': []}
 
+    def _cached_index(self, name, cminions, build):
+        '''
+        Return the reverse index ``name`` of the cached minion data. It is
+        created by calling ``build`` with an iterator of ``(id, data)`` tuples
+        of the cached minions, and created again once the list of cached minions
+        changed or ``minion_data_cache_index_ttl`` seconds elapsed.
+
+        At most ``_CACHE_INDEX_MAX`` indexes are kept, the expired ones and
+        then the oldest ones being dropped to make room for a new index.
+        '''
+        ids = frozenset(cminions)
+        ttl = self.opts['minion_data_cache_index_ttl']
+        index = self._cache_index.get(name)
+        if index is None or index['ids'] != ids or time.time() - index['time'] > ttl:
+            now = time.time()
+            index = build(self._minion_data(ids))
+            index['ids'] = ids
+            index['time'] = now
+            for other in [other for other, other_index in six.iteritems(self._cache_index)
+                          if now - other_index['time'] > ttl]:
+                del self._cache_index[other]
+            self._cache_index.pop(name, None)
+            while len(self._cache_index) >= _CACHE_INDEX_MAX:
+                del self._cache_index[min(self._cache_index,
+                                          key=lambda other: self._cache_index[other]['time'])]
+            self._cache_index[name] = index
+        return index
+
+    def _minion_data(self, ids):
+        '''
+        Return an iterator of ``(id, data)`` tuples of the cached data of the
+        minions ``ids``, fetched in bulk.
+        '''
+        ids = list(ids)
+        mdatas = self.cache.fetch_many(['minions/{0}'.format(id_) for id_ in ids], 'data')
+        return zip(ids, (mdata for _, mdata in mdatas))
+
+    def _fetch_minion_data(self, ids):
+        '''
+        Return an iterator of ``(id, data)`` tuples of the cached data of the
+        minions ``ids``, leaving out those whose data could not be read.
+        '''
+        ids = list(ids)
+        done = 0
+        try:
+            for id_, mdata in self._minion_data(ids):
+                yield id_, mdata
+                done += 1
+        except SaltCacheError:
+            # Fall back to fetching the remaining minions one by one
+            pass
+        for id_ in ids[done:]:
+            try:
+                mdata = self.cache.fetch('minions/{0}'.format(id_), 'data')
+            except SaltCacheError:
+                # If a SaltCacheError is explicitly raised during the fetch operation,
+                # permission was denied to open the cached data.p file. Continue on as
+                # in the releases <= 2016.3. (An explicit error raise was added in PR
+                # #35388. See issue #36867 for more information.
+                continue
+            yield id_, mdata
+
+    def _cache_index_match(self, search_type, cminions, key, value, delimiter):
+        '''
+        Look up the minions whose cached ``search_type`` data has ``value`` at
+        ``key`` in a reverse index of that key.
+
+        Return a tuple of the set of minions having cached data and the set
+        of those matching.
+        '''
+        def build(mdatas):
+            index = {'cached': set(), 'values': {}}
+            for id_, mdata in mdatas:
+                if mdata is None:
+                    continue
+                index['cached'].add(id_)
+                data = salt.utils.data.traverse_dict_and_list(
+                    mdata.get(search_type), key, {}, delimiter=delimiter)
+                if data == {}:
+                    continue
+                # Same comparisons as salt.utils.data.subdict_match(): a
+                # pattern matches the names of the keys of a dict and the
+                # lowercase string form of anything else, list members
+                # being compared one by one
+                tokens = set()
+                if isinstance(data, dict):
+                    tokens.update(('key', name) for name in data)
+                elif isinstance(data, (list, tuple)):
+                    for member in data:
+                        if isinstance(member, dict):
+                            tokens.update(('key', name) for name in member)
+                        tokens.add(('value', _match_value(member)))
+                else:
+                    tokens.add(('value', _match_value(data)))
+                for token in tokens:
+                    index['values'].setdefault(token, set()).add(id_)
+            return index
+
+        index = self._cached_index((search_type, key, delimiter), cminions, build)
+        matched = index['values'].get(('key', value), set()) | \
+            index['values'].get(('value', _match_value(value)), set())
+        return index['cached'], matched
+
+    def _ipcidr_index_match(self, cminions, tgt):
+        '''
+        Look up the minions with an address within ``tgt``, an IP address or
+        network, in a sorted table of the addresses found in the cached
+        grains.
+
+        Return a tuple of the set of minions having cached data and the set
+        of those matching.
+        '''
+        proto = 'ipv{0}'.format(tgt.version)
+
+        def build(mdatas):
+            cached = set()
+            table = []
+            for id_, mdata in mdatas:
+                if mdata is None:
+                    continue
+                cached.add(id_)
+                for addr in (mdata.get('grains') or {}).get(proto, []):
+                    try:
+                        addr = ipaddress.ip_address(addr)
+                    except ValueError:
+                        continue
+                    if addr.version == tgt.version:
+                        table.append((int(addr), id_))
+            table.sort()
+            return {'cached': cached,
+                    'addrs': [addr for addr, _ in table],
+                    'minions': [id_ for _, id_ in table]}
+
+        index = self._cached_index(('ipcidr', proto), cminions, build)
+        if isinstance(tgt, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            low = high = int(tgt)
+        else:
+            low = int(tgt.network_address)
+            high = int(tgt.broadcast_address)
+        matched = set(index['minions'][bisect.bisect_left(index['addrs'], low):
+                                       bisect.bisect_right(index['addrs'], high)])
+        return index['cached'], matched
+
     def _check_grain_minions(self, expr, delimiter, greedy):
         '''
         Return the minions found by looking via grains
@@ -365,17 +817,15 @@ class CkMinions(object):
         '''
         Return the minions found by looking via ipcidr
         '''
-        cache_enabled = self.opts.get('minion_data_cache', False)
-
         if greedy:
             minions = self._pki_minions()
-        elif cache_enabled:
+        elif self._cache_enabled:
             minions = self.cache.list('minions')
         else:
             return {'minions': [],
                     'missing': []}
 
-        if cache_enabled:
+        if self._cache_enabled:
             if greedy:
                 cminions = self.cache.list('minions')
             else:
@@ -399,8 +849,16 @@ class CkMinions(object):
             proto = 'ipv{0}'.format(tgt.version)
 
             minions = set(minions)
-            for id_ in cminions:
-                mdata = self.cache.fetch('minions/{0}'.format(id_), 'data')
+            if self.opts.get('minion_data_cache_index_ttl', 0) > 0:
+                cached, matched = self._ipcidr_index_match(cminions, tgt)
+                if greedy:
+                    # Minions without cached data are kept
+                    minions -= cached - matched
+                else:
+                    minions &= matched
+                return {'minions': list(minions),
+                        'missing': []}
+            for id_, mdata in self._minion_data(cminions):
                 if mdata is None:
                     if not greedy:
                         minions.remove(id_)
@@ -436,15 +894,10 @@ class CkMinions(object):
             log.error(
                 'Range exception in compound match: %s', exc
             )
-            cache_enabled = self.opts.get('minion_data_cache', False)
             if greedy:
-                mlist = []
-                for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-                    if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                        mlist.append(fn_)
-                return {'minions': mlist,
+                return {'minions': _list_key_files(os.path.join(self.opts['pki_dir'], self.acc)),
                         'missing': []}
-            elif cache_enabled:
+            elif self._cache_enabled:
                 return {'minions': self.cache.list('minions'),
                         'missing': []}
             else:
@@ -462,6 +915,163 @@ class CkMinions(object):
                                             greedy,
                                             pillar_exact=True)
 
+    def _parse_compound(self, expr, pillar_exact=False):
+        '''
+        Parse the compound target ``expr`` into a tuple of steps in reverse
+        polish notation. A step is either an ``(engine, args, extra_args)``
+        tuple, whose minions are to be pushed on a stack, or one of the '&'
+        (and), '|' (or) and '-' (not) set operators, to be applied to the top
+        of that stack. Nodegroups are expanded and engines resolved here so
+        only the engines have to be called again for fresh minion data.
+
+        Return None if ``expr`` is invalid. Valid expressions are cached.
+        '''
+        self._check_nodegroups()
+        try:
+            key = (expr if isinstance(expr, six.string_types) else tuple(expr),
+                   pillar_exact)
+            return self._compound_cache[key]
+        except TypeError:
+            # Unhashable words, don't cache
+            key = None
+        except KeyError:
+            pass
+
+        ref = {'G': self._check_grain_minions,
+               'P': self._check_grain_pcre_minions,
+               'I': self._check_pillar_minions,
+               'J': self._check_pillar_pcre_minions,
+               'L': self._check_list_minions,
+               'N': None,    # nodegroups should already be expanded
+               'S': self._check_ipcidr_minions,
+               'E': self._check_pcre_minions,
+               'R': self._all_minions}
+        if pillar_exact:
+            ref['I'] = self._check_pillar_exact_minions
+            ref['J'] = self._check_pillar_exact_minions
+
+        # Shunting-yard: '&', '|', '-' and '(' wait on the operator stack
+        # until an operator of lower or equal precedence, a ')' or the end of
+        # the expression moves them to the steps. 'not' binds tightest, then
+        # 'and', then 'or', matching the precedence of the python set
+        # operators the expression used to be evaluated with.
+        steps = []
+        opers = []
+        precedence = {'|': 1, '&': 2, '-': 3}
+        # True when the next word has to be a target or an opening
+        # parenthesis rather than a binary operator or ')'
+        expect_operand = True
+
+        def push_oper(oper):
+            while opers and opers[-1] != '(' and \
+                    precedence[opers[-1]] >= precedence[oper]:
+                steps.append(opers.pop())
+            opers.append(oper)
+
+        if isinstance(expr, six.string_types):
+            words = collections.deque(expr.split())
+        else:
+            # we make a shallow copy in order to not affect the passed in arg
+            words = collections.deque(expr)
+
+        while words:
+            word = words.popleft()
+            target_info = parse_target(word)
+
+            # Easy check first
+            if word in ('and', 'or'):
+                if expect_operand:
+                    log.error('Invalid compound expr (unexpected binary '
+                              'operator "%s"): %s', word, expr)
+                    return None
+                push_oper('&' if word == 'and' else '|')
+                expect_operand = True
+            elif word == 'not':
+                if opers and opers[-1] == '-' and expect_operand:
+                    log.error('Invalid compound expr (repeated "not"): %s',
+                              expr)
+                    return None
+                if not expect_operand:
+                    # "A not B" is evaluated as "A and not B"
+                    push_oper('&')
+                opers.append('-')
+                expect_operand = True
+            elif word == '(':
+                if not expect_operand:
+                    log.error('Invalid compound expr (unexpected left '
+                              'parenthesis): %s', expr)
+                    return None
+                opers.append(word)
+            elif word == ')':
+                if expect_operand or '(' not in opers:
+                    log.error('Invalid compound expr (unexpected '
+                              'right parenthesis): %s',
+                              expr)
+                    return None
+                while opers[-1] != '(':
+                    steps.append(opers.pop())
+                opers.pop()
+                expect_operand = False
+
+            elif target_info and target_info['engine']:
+                if 'N' == target_info['engine']:
+                    # if we encounter a node group, just evaluate it in-place
+                    decomposed = self._nodegroup_comp(target_info['pattern'])
+                    if decomposed:
+                        words.extendleft(reversed(decomposed))
+                    continue
+
+                engine = ref.get(target_info['engine'])
+                if not engine:
+                    # If an unknown engine is called at any time, fail out
+                    log.error(
+                        'Unrecognized target engine "%s" for'
+                        ' target expression "%s"',
+                        target_info['engine'],
+                        word,
+                    )
+                    return None
+                if not expect_operand:
+                    log.error('Invalid compound expr (missing operator '
+                              'before "%s"): %s', word, expr)
+                    return None
+
+                engine_args = (target_info['pattern'],)
+                if target_info['engine'] in ('G', 'P', 'I', 'J'):
+                    engine_args += (target_info['delimiter'] or ':',)
+                # greedy goes between engine_args and extra_args
+                extra_args = ()
+
+                # ignore missing minions for lists if we exclude them with
+                # a 'not'
+                if 'L' == target_info['engine']:
+                    extra_args += (bool(opers) and opers[-1] == '-',)
+                steps.append((engine, engine_args, extra_args))
+                expect_operand = False
+
+            else:
+                if not expect_operand:
+                    log.error('Invalid compound expr (missing operator '
+                              'before "%s"): %s', word, expr)
+                    return None
+                # The match is not explicitly defined, evaluate as a glob
+                steps.append((self._check_glob_minions, (word,), ()))
+                expect_operand = False
+
+        if expect_operand:
+            log.error('Invalid compound target: %s', expr)
+            return None
+
+        # Any '(' left unmatched is implicitly closed at the end
+        steps.extend(oper for oper in reversed(opers) if oper != '(')
+        steps = tuple(steps)
+
+        if key is not None:
+            if len(self._compound_cache) >= 4096:
+                self._compound_cache.clear()
+            self._compound_cache[key] = steps
+        return steps
+
     def _check_compound_minions(self,
                                 expr,
                                 delimiter,
@@ -473,148 +1083,71 @@ class CkMinions(object):
         if not isinstance(expr, six.string_types) and not isinstance(expr, (list, tuple)):
             log.error('Compound target that is neither string, list nor tuple')
             return {'minions': [], 'missing': []}
-        minions = set(self._pki_minions())
-        log.debug('minions: %s', minions)
-
-        nodegroups = self.opts.get('nodegroups', {})
-
-        if self.opts.get('minion_data_cache', False):
-            ref = {'G': self._check_grain_minions,
-                   'P': self._check_grain_pcre_minions,
-                   'I': self._check_pillar_minions,
-                   'J': self._check_pillar_pcre_minions,
-                   'L': self._check_list_minions,
-                   'N': None,    # nodegroups should already be expanded
-                   'S': self._check_ipcidr_minions,
-                   'E': self._check_pcre_minions,
-                   'R': self._all_minions}
-            if pillar_exact:
-                ref['I'] = self._check_pillar_exact_minions
-                ref['J'] = self._check_pillar_exact_minions
-
-            results = []
-            unmatched = []
-            opers = ['and', 'or', 'not', '(', ')']
+        if self._cache_enabled:
+            steps = self._parse_compound(expr, pillar_exact)
+            if steps is None:
+                return {'minions': [], 'missing': []}
+            if '-' in steps:
+                # Only 'not' needs the set of all the minions, build it once
+                # and share it between all of them
+                minions = frozenset(self._pki_minions())
+                log.debug('minions: %s', minions)
+
+            # The engines reading the minion data cache are I/O bound, run
+            # them concurrently when the expression uses several of them.
+            # This is only done for the thread safe drivers fetching many
+            # minions in a single request: the other thread safe drivers
+            # already spread their fetches over cache_workers threads, and
+            # with the indexes enabled the engines work on data in memory.
+            cache_engines = (self._check_grain_minions,
+                             self._check_grain_pcre_minions,
+                             self._check_pillar_minions,
+                             self._check_pillar_pcre_minions,
+                             self._check_pillar_exact_minions,
+                             self._check_ipcidr_minions)
+            cache_steps = [idx for idx, step in enumerate(steps)
+                           if isinstance(step, tuple) and step[0] in cache_engines]
+            workers = min(self.opts.get('cache_workers', 16), len(cache_steps))
+            futures = {}
+            executor = None
+            if HAS_FUTURES and workers > 1 and \
+                    self.opts.get('minion_data_cache_index_ttl', 0) <= 0 and \
+                    self.cache.thread_safe and \
+                    '{0}.fetch_many'.format(self.cache.driver) in self.cache.modules:
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+                for idx in cache_steps:
+                    engine, engine_args, extra_args = steps[idx]
+                    futures[idx] = executor.submit(
+                        engine, *(engine_args + (greedy,) + extra_args))
+
+            operands = []
             missing = []
-
-            if isinstance(expr, six.string_types):
-                words = expr.split()
-            else:
-                # we make a shallow copy in order to not affect the passed in arg
-                words = expr[:]
-
-            while words:
-                word = words.pop(0)
-                target_info = parse_target(word)
-
-                # Easy check first
-                if word in opers:
-                    if results:
-                        if results[-1] == '(' and word in ('and', 'or'):
-                            log.error('Invalid beginning operator after "(": %s', word)
-                            return {'minions': [], 'missing': []}
-                        if word == 'not':
-                            if not results[-1] in ('&', '|', '('):
-                                results.append('&')
-                            results.append('(')
-                            results.append(six.text_type(set(minions)))
-                            results.append('-')
-                            unmatched.append('-')
-                        elif word == 'and':
-                            results.append('&')
-                        elif word == 'or':
-                            results.append('|')
-                        elif word == '(':
-                            results.append(word)
-                            unmatched.append(word)
-                        elif word == ')':
-                            if not unmatched or unmatched[-1] != '(':
-                                log.error('Invalid compound expr (unexpected '
-                                          'right parenthesis): %s',
-                                          expr)
-                                return {'minions': [], 'missing': []}
-                            results.append(word)
-                            unmatched.pop()
-                            if unmatched and unmatched[-1] == '-':
-                                results.append(')')
-                                unmatched.pop()
-                        else:  # Won't get here, unless oper is added
-                            log.error('Unhandled oper in compound expr: %s',
-                                      expr)
-                            return {'minions': [], 'missing': []}
-                    else:
-                        # seq start with oper, fail
-                        if word == 'not':
-                            results.append('(')
-                            results.append(six.text_type(set(minions)))
-                            results.append('-')
-                            unmatched.append('-')
-                        elif word == '(':
-                            results.append(word)
-                            unmatched.append(word)
-                        else:
-                            log.error(
-                                'Expression may begin with'
-                                ' binary operator: %s', word
-                            )
-                            return {'minions': [], 'missing': []}
-
-                elif target_info and target_info['engine']:
-                    if 'N' == target_info['engine']:
-                        # if we encounter a node group, just evaluate it in-place
-                        decomposed = nodegroup_comp(target_info['pattern'], nodegroups)
-                        if decomposed:
-                            words = decomposed + words
-                        continue
-
-                    engine = ref.get(target_info['engine'])
-                    if not engine:
-                        # If an unknown engine is called at any time, fail out
-                        log.error(
-                            'Unrecognized target engine "%s" for'
-                            ' target expression "%s"',
-                            target_info['engine'],
-                            word,
-                        )
-                        return {'minions': [], 'missing': []}
-
-                    engine_args = [target_info['pattern']]
-                    if target_info['engine'] in ('G', 'P', 'I', 'J'):
-                        engine_args.append(target_info['delimiter'] or ':')
-                    engine_args.append(greedy)
-
-                    # ignore missing minions for lists if we exclude them with
-                    # a 'not'
-                    if 'L' == target_info['engine']:
-                        engine_args.append(results and results[-1] == '-')
-                    _results = engine(*engine_args)
-                    results.append(six.text_type(set(_results['minions'])))
-                    missing.extend(_results['missing'])
-                    if unmatched and unmatched[-1] == '-':
-                        results.append(')')
-                        unmatched.pop()
-
-                else:
-                    # The match is not explicitly defined, evaluate as a glob
-                    _results = self._check_glob_minions(word, True)
-                    results.append(six.text_type(set(_results['minions'])))
-                    if unmatched and unmatched[-1] == '-':
-                        results.append(')')
-                        unmatched.pop()
-
-            # Add a closing ')' for each item left in unmatched
-            results.extend([')' for item in unmatched])
-
-            results = ' '.join(results)
-            log.debug('Evaluating final compound matching expr: %s',
-                      results)
             try:
-                minions = list(eval(results))  # pylint: disable=W0123
-                return {'minions': minions, 'missing': missing}
-            except Exception:
-                log.error('Invalid compound target: %s', expr)
-                return {'minions': [], 'missing': []}
+                for idx, step in enumerate(steps):
+                    if step == '-':
+                        operands.append(minions - operands.pop())
+                    elif step == '&':
+                        right = operands.pop()
+                        operands.append(operands.pop() & right)
+                    elif step == '|':
+                        right = operands.pop()
+                        operands.append(operands.pop() | right)
+                    elif idx in futures:
+                        _results = futures[idx].result()
+                        operands.append(frozenset(_results['minions']))
+                        missing.extend(_results['missing'])
+                    else:
+                        engine, engine_args, extra_args = step
+                        _results = engine(*(engine_args + (greedy,) + extra_args))
+                        operands.append(frozenset(_results['minions']))
+                        missing.extend(_results['missing'])
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            return {'minions': list(operands.pop()), 'missing': missing}
 
+        minions = self._pki_minions()
+        log.debug('minions: %s', minions)
         return {'minions': list(minions),
                 'missing': []}
 
@@ -636,7 +1169,7 @@ class CkMinions(object):
                 'minions.'
             )
         minions = set()
-        if self.opts.get('minion_data_cache', False):
+        if self._cache_enabled:
             search = self.cache.list('minions')
             if search is None:
                 return minions
@@ -651,42 +1184,46 @@ class CkMinions(object):
                 addrs.update(set(salt.utils.network.ip_addrs6(include_loopback=False)))
             if subset:
                 search = subset
-            for id_ in search:
+
+            def build(mdatas):
+                # Map every address found in the cached grains to the minions
+                # having it, along with its position in their list of
+                # addresses so that the first one connected can be reported
+                index = {'ipv4': {}, 'ipv6': {}}
+                for id_, mdata in mdatas:
+                    if mdata is None:
+                        continue
+                    grains = mdata.get('grains', {})
+                    for proto in ('ipv4', 'ipv6'):
+                        for pos, addr in enumerate(grains.get(proto, [])):
+                            index[proto].setdefault(addr, []).append((pos, id_))
+                return index
+
+            index = None
+            if not subset and self.opts.get('minion_data_cache_index_ttl', 0) > 0:
                 try:
-                    mdata = self.cache.fetch('minions/{0}'.format(id_), 'data')
+                    index = self._cached_index('connected', search, build)
                 except SaltCacheError:
-                    # If a SaltCacheError is explicitly raised during the fetch operation,
-                    # permission was denied to open the cached data.p file. Continue on as
-                    # in the releases <= 2016.3. (An explicit error raise was added in PR
-                    # #35388. See issue #36867 for more information.
-                    continue
-                if mdata is None:
-                    continue
-                grains = mdata.get('grains', {})
-                for ipv4 in grains.get('ipv4', []):
-                    if ipv4 in addrs:
-                        if show_ip:
-                            minions.add((id_, ipv4))
-                        else:
-                            minions.add(id_)
-                        break
-                for ipv6 in grains.get('ipv6', []):
-                    if ipv6 in addrs:
-                        if show_ip:
-                            minions.add((id_, ipv6))
-                        else:
-                            minions.add(id_)
-                        break
+                    pass
+            if index is None:
+                index = build(self._fetch_minion_data(search))
+            for proto in ('ipv4', 'ipv6'):
+                first = {}
+                for addr in addrs:
+                    for pos, id_ in index[proto].get(addr, ()):
+                        if id_ not in first or pos < first[id_][0]:
+                            first[id_] = (pos, addr)
+                if show_ip:
+                    minions.update((id_, addr) for id_, (_, addr) in six.iteritems(first))
+                else:
+                    minions.update(first)
         return minions
 
     def _all_minions(self, expr=None):
         '''
         Return a list of all minions that have auth'd
         '''
-        mlist = []
-        for fn_ in salt.utils.data.sorted_ignorecase(os.listdir(os.path.join(self.opts['pki_dir'], self.acc))):
-            if not fn_.startswith('.') and os.path.isfile(os.path.join(self.opts['pki_dir'], self.acc, fn_)):
-                mlist.append(fn_)
+        mlist = _list_key_files(os.path.join(self.opts['pki_dir'], self.acc))
         return {'minions': mlist, 'missing': []}
 
     def check_minions(self,
@@ -716,9 +1253,13 @@ class CkMinions(object):
             else:
                 _res = check_func(expr, greedy)
             _res['ssh_minions'] = False
-            if self.opts.get('enable_ssh_minions', False) is True and isinstance('tgt', six.string_types):
-                roster = salt.roster.Roster(self.opts, self.opts.get('roster', 'flat'))
-                ssh_minions = roster.targets(expr, tgt_type)
+            if self.opts.get('enable_ssh_minions', False) is True and isinstance(expr, six.string_types):
+                if self._ssh_roster is None:
+                    # Setting up the roster loads the roster, runner and utils
+                    # modules; the roster backends read their targets on
+                    # every call anyway
+                    self._ssh_roster = salt.roster.Roster(self.opts, self.opts.get('roster', 'flat'))
+                ssh_minions = self._ssh_roster.targets(expr, tgt_type)
                 if ssh_minions:
                     _res['minions'].extend(ssh_minions)
                     _res['ssh_minions'] = True
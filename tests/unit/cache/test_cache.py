@@ -6,12 +6,20 @@ unit tests for salt.cache
 # Import Python libs
 from __future__ import absolute_import, print_function, unicode_literals
 
+# Import 3rd-party libs
+try:
+    import concurrent.futures
+    HAS_FUTURES = True
+except ImportError:
+    HAS_FUTURES = False
+
 # Import Salt Testing libs
 # import integration
 from tests.support.unit import skipIf, TestCase
 from tests.support.mock import (
     NO_MOCK,
     NO_MOCK_REASON,
+    MagicMock,
     patch,
 )
 
@@ -40,6 +48,43 @@ class CacheFunctionsTest(TestCase):
         ret = salt.cache.factory(self.opts)
         self.assertIsInstance(ret, salt.cache.MemCache)
 
+    @skipIf(not HAS_FUTURES, 'concurrent.futures is not available')
+    def test_fetch_many(self):
+        def fetch(bank, key, **kwargs):
+            return {'bank': bank, 'key': key}
+
+        banks = ['minions/{0}'.format(idx) for idx in range(250)]
+        expected = [(bank, {'bank': bank, 'key': 'data'}) for bank in banks]
+        for thread_safe in (True, False):
+            modules = {'localfs.fetch': fetch}
+            if thread_safe:
+                modules['localfs.thread_safe'] = lambda: True
+            for workers in (1, 16):
+                self.opts['cache_workers'] = workers
+                cache = salt.cache.factory(self.opts)
+                with patch('salt.loader.cache', return_value=modules), \
+                        patch('concurrent.futures.ThreadPoolExecutor',
+                              wraps=concurrent.futures.ThreadPoolExecutor) as executor:
+                    self.assertEqual(cache.thread_safe, thread_safe)
+                    ret = list(cache.fetch_many(banks, 'data'))
+                self.assertEqual(ret, expected)
+                # Only thread safe drivers get their fetches threaded
+                self.assertEqual(executor.called, thread_safe and workers > 1)
+
+    def test_fetch_many_driver(self):
+        def fetch_many(banks, key, **kwargs):
+            return dict((bank, key) for bank in banks)
+
+        banks = ['minions/{0}'.format(idx) for idx in range(250)]
+        fetch_many = MagicMock(side_effect=fetch_many)
+        cache = salt.cache.factory(self.opts)
+        with patch('salt.loader.cache', return_value={'localfs.fetch_many': fetch_many}):
+            ret = list(cache.fetch_many(banks, 'data'))
+        self.assertEqual(ret, [(bank, 'data') for bank in banks])
+        # The banks are fetched in chunks
+        self.assertEqual([len(args[0]) for args, _ in fetch_many.call_args_list],
+                         [100, 100, 50])
+
 
 @skipIf(NO_MOCK, NO_MOCK_REASON)
 class MemCacheTest(TestCase):
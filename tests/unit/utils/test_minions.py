@@ -2,12 +2,28 @@
 
 # Import python libs
 from __future__ import absolute_import, unicode_literals
+import os
+import shutil
 import sys
+import tempfile
+import time
+
+# Import 3rd-party libs
+try:
+    import concurrent.futures
+    HAS_FUTURES = True
+except ImportError:
+    HAS_FUTURES = False
 
 # Import Salt Libs
+import salt.utils.data
+import salt.utils.files
 import salt.utils.minions
+from salt.exceptions import SaltCacheError
+from salt.ext import six
 
 # Import Salt Testing Libs
+from tests.support.runtests import RUNTIME_VARS
 from tests.support.unit import TestCase, skipIf
 from tests.support.mock import (
     patch,
@@ -29,6 +45,18 @@ EXPECTED = {
 }
 
 
+def _minion_data_cache(mdata):
+    '''
+    Return a mocked minion data cache holding ``mdata``, a dict mapping the
+    ``minions/<id>`` banks to the cached data of the minions
+    '''
+    cache = MagicMock()
+    cache.list.return_value = sorted(bank.split('/', 1)[1] for bank in mdata)
+    cache.fetch.side_effect = lambda bank, key: mdata[bank]
+    cache.fetch_many.side_effect = lambda banks, key: iter([(bank, mdata[bank]) for bank in banks])
+    return cache
+
+
 class MinionsTestCase(TestCase):
     '''
     TestCase for salt.utils.minions module functions
@@ -368,6 +396,345 @@ class CkMinionsTestCase(TestCase):
         ret = self.ckminions.auth_check(auth_list, 'test.arg', args, 'runner')
         self.assertTrue(ret)
 
+    @patch('salt.utils.minions.CkMinions._pki_minions',
+           MagicMock(return_value=['web1', 'web2', 'db1', 'webdb']))
+    def test_check_glob_minions(self):
+        ret = self.ckminions._check_glob_minions('web*', True)
+        self.assertEqual(ret, {'minions': ['web1', 'web2', 'webdb'], 'missing': []})
+        ret = self.ckminions._check_glob_minions('*****db*', True)
+        self.assertEqual(ret['minions'], ['db1', 'webdb'])
+        ret = self.ckminions._check_glob_minions('w?b[12]', True)
+        self.assertEqual(ret['minions'], ['web1', 'web2'])
+        ret = self.ckminions._check_glob_minions('web', True)
+        self.assertEqual(ret['minions'], [])
+        ret = self.ckminions._check_glob_minions('*1', True)
+        self.assertEqual(ret['minions'], ['web1', 'db1'])
+        ret = self.ckminions._check_glob_minions('webdb', True)
+        self.assertEqual(ret['minions'], ['webdb'])
+        ret = self.ckminions._check_glob_minions('*b*1', True)
+        self.assertEqual(ret['minions'], ['web1', 'db1'])
+
+    @patch('salt.utils.minions.CkMinions._pki_minions',
+           MagicMock(return_value=['web1', 'web2', 'db1', 'webdb']))
+    def test_check_pcre_minions(self):
+        ret = self.ckminions._check_pcre_minions(r'web\d', True)
+        self.assertEqual(ret, {'minions': ['web1', 'web2'], 'missing': []})
+        ret = self.ckminions._check_pcre_minions('.*db', True)
+        self.assertEqual(ret['minions'], ['db1', 'webdb'])
+
+    def test_pki_minions_key_cache(self):
+        pki_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.addCleanup(shutil.rmtree, pki_dir)
+        acc_dir = os.path.join(pki_dir, 'minions')
+        os.makedirs(acc_dir)
+        ckminions = salt.utils.minions.CkMinions({'pki_dir': pki_dir,
+                                                  'key_cache': 'sched'})
+        key_cache = os.path.join(acc_dir, '.key_cache')
+
+        def write_key_cache(minions):
+            with salt.utils.files.fopen(key_cache, 'wb') as fn_:
+                ckminions.serial.dump(minions, fn_)
+
+        write_key_cache(['alpha', 'beta'])
+        self.assertEqual(ckminions._pki_minions(), ['alpha', 'beta'])
+
+        # The loaded list is reused until the file changes
+        with patch.object(ckminions.serial, 'load', MagicMock(side_effect=AssertionError)):
+            self.assertEqual(ckminions._pki_minions(), ['alpha', 'beta'])
+        write_key_cache(['alpha', 'beta', 'gamma'])
+        self.assertEqual(ckminions._pki_minions(), ['alpha', 'beta', 'gamma'])
+
+    @patch('salt.utils.minions.CkMinions._pki_minions',
+           MagicMock(return_value=['web1', 'web2', 'db1', 'webdb']))
+    def test_check_list_minions(self):
+        ret = self.ckminions._check_list_minions('db1,nope,web1,', True)
+        self.assertEqual(ret, {'minions': ['db1', 'web1'], 'missing': ['nope']})
+        ret = self.ckminions._check_list_minions(['web2', 'nope'], True, ignore_missing=True)
+        self.assertEqual(ret, {'minions': ['web2'], 'missing': []})
+
+    @patch('salt.utils.minions.CkMinions._pki_minions',
+           MagicMock(return_value=['web1', 'web2', 'db1', 'webdb']))
+    def test_check_compound_minions(self):
+        tests = {
+            'web* and not web2': ['web1', 'webdb'],
+            'db1 or web1 and web*': ['db1', 'web1'],
+            '( db1 or web1 ) and web*': ['web1'],
+            'web* not L@web1': ['web2', 'webdb'],
+            'not ( web* )': ['db1'],
+            'not web* or web1': ['db1', 'web1'],
+            '( web1 or db1': ['db1', 'web1'],
+            'and web1': [],
+            'web1 db1': [],
+            'web1 )': [],
+            'web1 and': [],
+            'not not web1': [],
+        }
+        for expr, expected in six.iteritems(tests):
+            ret = self.ckminions._check_compound_minions(expr, ':', True)
+            self.assertEqual(sorted(ret['minions']), expected, expr)
+            self.assertEqual(ret['missing'], [])
+
+        ret = self.ckminions._check_compound_minions('L@web1,nope', ':', True)
+        self.assertEqual(ret, {'minions': ['web1'], 'missing': ['nope']})
+        ret = self.ckminions._check_compound_minions(
+            ['web*', 'and', 'not', 'L@web1,nope'], ':', True)
+        self.assertEqual(sorted(ret['minions']), ['web2', 'webdb'])
+        self.assertEqual(ret['missing'], [])
+
+    def test_pki_minions(self):
+        pki_dir = tempfile.mkdtemp(dir=RUNTIME_VARS.TMP)
+        self.addCleanup(shutil.rmtree, pki_dir)
+        acc_dir = os.path.join(pki_dir, 'minions')
+        os.makedirs(os.path.join(acc_dir, 'subdir'))
+        for name in ('beta', 'Alpha', '.hidden'):
+            with salt.utils.files.fopen(os.path.join(acc_dir, name), 'w'):
+                pass
+        mtime = time.time() - 10
+        os.utime(acc_dir, (mtime, mtime))
+        ckminions = salt.utils.minions.CkMinions({'pki_dir': pki_dir,
+                                                  'key_cache': ''})
+        self.assertEqual(sorted(ckminions._pki_minions()), ['Alpha', 'beta'])
+
+        # The listing is reused until the directory is modified
+        with patch('salt.utils.minions._list_key_files',
+                   MagicMock(side_effect=AssertionError)):
+            self.assertEqual(sorted(ckminions._pki_minions()), ['Alpha', 'beta'])
+        os.remove(os.path.join(acc_dir, 'beta'))
+        os.utime(acc_dir, (mtime + 5, mtime + 5))
+        self.assertEqual(ckminions._pki_minions(), ['Alpha'])
+
+        # A listing taken right after the directory was modified is not
+        # reused, a key accepted in the same clock tick keeps the mtime
+        mtime = time.time()
+        os.utime(acc_dir, (mtime, mtime))
+        self.assertEqual(ckminions._pki_minions(), ['Alpha'])
+        with salt.utils.files.fopen(os.path.join(acc_dir, 'gamma'), 'w'):
+            pass
+        os.utime(acc_dir, (mtime, mtime))
+        self.assertEqual(sorted(ckminions._pki_minions()), ['Alpha', 'gamma'])
+
+    def test_check_cache_minions(self):
+        mdata = {
+            'minions/web1': {'grains': {'role': 'web', 'os': 'Debian'}},
+            'minions/web2': {'grains': {'role': 'web', 'os': 'CentOS'}},
+            'minions/db1': {'grains': {'role': 'db', 'os': 'Debian'}},
+            'minions/new': None,
+        }
+        cache = _minion_data_cache(mdata)
+        self.ckminions.cache = cache
+
+        ret = self.ckminions._check_grain_minions('role:web', ':', False)
+        self.assertEqual(sorted(ret['minions']), ['web1', 'web2'])
+        ret = self.ckminions._check_grain_minions('os:Deb*', ':', False)
+        self.assertEqual(sorted(ret['minions']), ['db1', 'web1'])
+        ret = self.ckminions._check_grain_pcre_minions('os:(Cent|Deb)', ':', False)
+        self.assertEqual(sorted(ret['minions']), ['db1', 'web1', 'web2'])
+        ret = self.ckminions._check_grain_minions('role:nope', ':', False)
+        self.assertEqual(ret['minions'], [])
+
+    def test_check_cache_minions_index(self):
+        mdata = {
+            'minions/web1': {'grains': {'role': 'web', 'roles': ['Web', 'db'],
+                                        'os': {'Debian': 9}}},
+            'minions/web2': {'grains': {'role': 'WEB', 'roles': [{'lb': True}],
+                                        'num': 2}},
+            'minions/db1': {'grains': {'role': 'db', 'os': 'Debian', 'num': '2'}},
+            'minions/new': None,
+        }
+        cache = _minion_data_cache(mdata)
+        self.ckminions.cache = cache
+
+        exprs = (('role:web', ':'), ('roles:db', ':'), ('roles:lb', ':'),
+                 ('os:Debian', ':'), ('os:debian', ':'), ('num:2', ':'),
+                 ('role:nope', ':'), ('nope:web', ':'), ('os,Debian:9', ','),
+                 ('os,debian', ','))
+        self.ckminions.opts['minion_data_cache_index_ttl'] = 0
+        expected = [sorted(self.ckminions._check_grain_minions(expr, delimiter, False)['minions'])
+                    for expr, delimiter in exprs]
+        self.ckminions.opts['minion_data_cache_index_ttl'] = 60
+        ret = [sorted(self.ckminions._check_grain_minions(expr, delimiter, False)['minions'])
+               for expr, delimiter in exprs]
+        self.assertEqual(ret, expected)
+        self.assertEqual(expected[8], ['web1'])
+
+        # The index of a key is reused as long as the cached minions don't change
+        cache.fetch_many.reset_mock()
+        self.ckminions._check_grain_minions('role:db', ':', False)
+        self.ckminions._check_grain_minions('role:web', ':', False)
+        cache.fetch_many.assert_not_called()
+        cache.list.return_value = ['web1', 'web2', 'db1']
+        ret = self.ckminions._check_grain_minions('role:web', ':', False)
+        self.assertEqual(sorted(ret['minions']), ['web1', 'web2'])
+        self.assertEqual(cache.fetch_many.call_count, 1)
+
+        # Expired indexes are dropped, and only the newest ones are kept
+        with patch('salt.utils.minions._CACHE_INDEX_MAX', 2):
+            self.ckminions._check_grain_minions('roles:db', ':', False)
+            self.ckminions._check_grain_minions('os:Debian', ':', False)
+            self.assertEqual(sorted(key for _, key, _ in self.ckminions._cache_index),
+                             ['os', 'roles'])
+            self.ckminions.opts['minion_data_cache_index_ttl'] = 1
+            with patch('time.time', MagicMock(return_value=time.time() + 10)):
+                self.ckminions._check_grain_minions('role:web', ':', False)
+            self.assertEqual(list(self.ckminions._cache_index), [('grains', 'role', ':')])
+
+    @patch('salt.utils.minions.CkMinions._pki_minions',
+           MagicMock(return_value=['web1', 'web2', 'db1', 'new', 'nocache']))
+    def test_check_ipcidr_minions(self):
+        mdata = {
+            'minions/web1': {'grains': {'ipv4': ['10.0.0.1', '192.168.0.1'],
+                                        'ipv6': ['fe80::1']}},
+            'minions/web2': {'grains': {'ipv4': ['10.0.1.1'], 'ipv6': []}},
+            'minions/db1': {'grains': {'ipv4': ['172.16.0.1']}},
+            'minions/new': None,
+        }
+        cache = _minion_data_cache(mdata)
+        self.ckminions.cache = cache
+
+        exprs = ('10.0.0.0/8', '10.0.0.0/24', '10.0.1.1', '192.168.0.0/16',
+                 '0.0.0.0/0', 'fe80::/64', '::/0', '8.8.8.8')
+        for greedy in (True, False):
+            self.ckminions.opts['minion_data_cache_index_ttl'] = 0
+            expected = [sorted(self.ckminions._check_ipcidr_minions(expr, greedy)['minions'])
+                        for expr in exprs]
+            self.ckminions.opts['minion_data_cache_index_ttl'] = 60
+            ret = [sorted(self.ckminions._check_ipcidr_minions(expr, greedy)['minions'])
+                   for expr in exprs]
+            self.assertEqual(ret, expected)
+        self.assertEqual(expected[0], ['web1', 'web2'])
+        self.assertEqual(expected[2], ['web2'])
+
+    def test_connected_ids(self):
+        mdata = {
+            'minions/web1': {'grains': {'ipv4': ['10.0.0.1', '10.0.0.2'],
+                                        'ipv6': ['fe80::1']}},
+            'minions/web2': {'grains': {'ipv4': ['10.0.0.3'], 'ipv6': []}},
+            'minions/db1': {'grains': {'ipv4': ['172.16.0.1']}},
+            'minions/new': None,
+        }
+
+        def fetch(bank, key):
+            if bank == 'minions/web1':
+                raise SaltCacheError('Permission denied')
+            return mdata[bank]
+
+        cache = _minion_data_cache(mdata)
+        cache.fetch.side_effect = fetch
+        self.ckminions.cache = cache
+        self.ckminions.opts['publish_port'] = 4505
+        addrs = MagicMock(side_effect=lambda port: set(['10.0.0.2', '10.0.0.1', '10.0.0.3', 'fe80::1']))
+        with patch('salt.utils.network.local_port_tcp', addrs):
+            for ttl in (0, 60):
+                self.ckminions.opts['minion_data_cache_index_ttl'] = ttl
+                self.assertEqual(self.ckminions.connected_ids(), set(['web1', 'web2']))
+                self.assertEqual(self.ckminions.connected_ids(show_ip=True),
+                                 set([('web1', '10.0.0.1'), ('web1', 'fe80::1'),
+                                      ('web2', '10.0.0.3')]))
+                self.assertEqual(self.ckminions.connected_ids(subset=['web2', 'db1']),
+                                 set(['web2']))
+            # Minions whose cached data cannot be read are left out
+            self.ckminions.opts['minion_data_cache_index_ttl'] = 0
+            cache.fetch_many.side_effect = SaltCacheError('Permission denied')
+            self.assertEqual(self.ckminions.connected_ids(), set(['web2']))
+
+    @patch('salt.utils.minions.CkMinions._pki_minions',
+           MagicMock(return_value=['web1', 'db1']))
+    def test_check_minions_ssh_minions(self):
+        self.ckminions.opts['enable_ssh_minions'] = True
+        roster = MagicMock()
+        roster.return_value.targets.return_value = {'ssh1': {'host': '10.0.0.1'}}
+        with patch('salt.roster.Roster', roster):
+            ret = self.ckminions.check_minions('*1', 'glob')
+            self.assertEqual(sorted(ret['minions']), ['db1', 'ssh1', 'web1'])
+            self.assertTrue(ret['ssh_minions'])
+            self.ckminions.check_minions('web*', 'glob')
+            # Targets given as a list are not matched against the roster
+            ret = self.ckminions.check_minions(['web1', 'or', 'db1'], 'compound')
+            self.assertFalse(ret['ssh_minions'])
+        roster.assert_called_once_with(self.ckminions.opts, 'flat')
+        self.assertEqual(roster.return_value.targets.call_count, 2)
+
+    def test_nodegroup_comp_cache(self):
+        self.ckminions.opts['nodegroups'] = NODEGROUPS
+        ret = self.ckminions._nodegroup_comp('group3')
+        self.assertEqual(ret, EXPECTED['group3'])
+        ret.append('or')
+        with patch('salt.utils.minions.nodegroup_comp', MagicMock()) as nodegroup_comp:
+            self.assertEqual(self.ckminions._nodegroup_comp('group3'), EXPECTED['group3'])
+            nodegroup_comp.assert_not_called()
+        self.ckminions.opts['nodegroups'] = {'group3': 'L@host1'}
+        self.assertEqual(self.ckminions._nodegroup_comp('group3'), ['L@host1'])
+
+    @patch('salt.utils.minions.CkMinions._pki_minions',
+           MagicMock(return_value=['web1', 'web2', 'db1']))
+    @skipIf(not HAS_FUTURES, 'concurrent.futures is not available')
+    def test_check_compound_minions_concurrent(self):
+        mdata = {
+            'minions/web1': {'grains': {'role': 'web', 'ipv4': ['10.0.0.1']}},
+            'minions/web2': {'grains': {'role': 'web', 'ipv4': ['10.0.1.1']}},
+            'minions/db1': {'grains': {'role': 'db', 'ipv4': ['10.0.0.2']}},
+        }
+        cache = _minion_data_cache(mdata)
+        cache.driver = 'redis'
+        cache.thread_safe = True
+        cache.modules = {'redis.fetch_many': cache.fetch_many}
+        self.ckminions.cache = cache
+
+        expr = 'G@role:web and S@10.0.0.0/24 or ( db* and not G@role:web )'
+        executor = MagicMock(wraps=concurrent.futures.ThreadPoolExecutor)
+        with patch('concurrent.futures.ThreadPoolExecutor', executor):
+            for workers in (1, 16):
+                self.ckminions.opts['cache_workers'] = workers
+                ret = self.ckminions._check_compound_minions(expr, ':', False)
+                self.assertEqual(sorted(ret['minions']), ['db1', 'web1'])
+            executor.assert_called_once_with(max_workers=3)
+
+            # The terms are matched serially when the driver already threads
+            # its fetches, or when they are looked up in the indexes
+            executor.reset_mock()
+            cache.modules = {}
+            self.ckminions._check_compound_minions(expr, ':', False)
+            cache.modules = {'redis.fetch_many': cache.fetch_many}
+            self.ckminions.opts['minion_data_cache_index_ttl'] = 60
+            ret = self.ckminions._check_compound_minions(expr, ':', False)
+            self.assertEqual(sorted(ret['minions']), ['db1', 'web1'])
+            executor.assert_not_called()
+
+    def test_compile_subdict_predicate(self):
+        data = {'os': 'Debian', 'roles': ['Web', {'lb': True}],
+                'nested': {'a': {'b': 'c:d'}, 'k': 'v'}, 'num': 2}
+        exprs = ('os:Debian', 'os:deb*', 'os:(deb|cent)', 'roles:web', 'roles:lb',
+                 'nested:a:b:c:d', 'nested:a', 'nested:*:v', '*:v', 'num:2',
+                 'os', 'nope:x', 'os:*', 'nested:a:b:c*')
+        for expr in exprs:
+            for regex_match, exact_match in ((False, False), (True, False), (False, True)):
+                expected = bool(salt.utils.data.subdict_match(
+                    data, expr, regex_match=regex_match, exact_match=exact_match))
+                predicate = salt.utils.minions._compile_subdict_predicate(
+                    expr, ':', regex_match, exact_match)
+                self.assertEqual(predicate(data), expected, (expr, regex_match, exact_match))
+
+    def test_parse_compound(self):
+        self.ckminions.opts['nodegroups'] = {'webs': 'web*'}
+        steps = self.ckminions._parse_compound('N@webs and not L@web1 or db1')
+        self.assertEqual(steps, (
+            (self.ckminions._check_glob_minions, ('web*',), ()),
+            (self.ckminions._check_list_minions, ('web1',), (True,)),
+            '-',
+            '&',
+            (self.ckminions._check_glob_minions, ('db1',), ()),
+            '|',
+        ))
+        self.assertIsNone(self.ckminions._parse_compound('web1 or'))
+
+        # Parsed expressions are cached until the nodegroups change
+        with patch('salt.utils.minions.nodegroup_comp', MagicMock()) as nodegroup_comp:
+            self.assertIs(self.ckminions._parse_compound('N@webs and not L@web1 or db1'), steps)
+            nodegroup_comp.assert_not_called()
+        self.ckminions.opts['nodegroups'] = {'webs': 'db*'}
+        steps = self.ckminions._parse_compound('N@webs and not L@web1 or db1')
+        self.assertEqual(steps[0], (self.ckminions._check_glob_minions, ('db*',), ()))
+
 
 @skipIf(sys.version_info < (2, 7), 'Python 2.7 needed for dictionary equality assertions')
 class TargetParseTestCase(TestCase):
@@ -436,6 +803,25 @@ class TargetParseTestCase(TestCase):
         ret = salt.utils.minions.parse_target(r_tgt)
         self.assertDictEqual(ret, {'engine': 'R', 'pattern': 'a:b', 'delimiter': None})
 
+    def test_parse_delimited_target(self):
+        '''
+        Ensure proper parsing for targets with a custom delimiter
+        '''
+        ret = salt.utils.minions.parse_target('G,@a,b')
+        self.assertDictEqual(ret, {'engine': 'G', 'pattern': 'a,b', 'delimiter': ','})
+        ret = salt.utils.minions.parse_target('G@@a')
+        self.assertDictEqual(ret, {'engine': 'G', 'pattern': 'a', 'delimiter': '@'})
+        ret = salt.utils.minions.parse_target('L,@a,b')
+        self.assertDictEqual(ret, {'engine': None, 'pattern': 'L,@a,b', 'delimiter': None})
+
+    def test_parse_glob_target(self):
+        '''
+        Ensure targets without an engine are parsed as a plain pattern
+        '''
+        for tgt in ('web*', 'G@', 'G:@', 'X@a:b'):
+            ret = salt.utils.minions.parse_target(tgt)
+            self.assertDictEqual(ret, {'engine': None, 'pattern': tgt, 'delimiter': None})
+
     def test_parse_multiword_target(self):
         '''
         Ensure proper parsing for multi-word targets